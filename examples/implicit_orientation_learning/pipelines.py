@@ -8,8 +8,9 @@ from processors import MakeDictionary
 
 
 class ImplicitRotationPredictor(Processor):
-    def __init__(self, encoder, decoder, measure, renderer):
+    def __init__(self, encoder, decoder, measure, renderer, visualize=True):
         super(ImplicitRotationPredictor, self).__init__()
+        self.visualize = visualize
         self.show_decoded_image = pr.ShowImage('decoded_image', wait=False)
         self.show_closest_image = pr.ShowImage('closest_image', wait=False)
         self.encoder = EncoderPredictor(encoder)
@@ -22,9 +23,10 @@ class ImplicitRotationPredictor(Processor):
 
     def call(self, image):
         latent_vector, closest_image = self.encoder(image)
-        self.show_closest_image(closest_image)
         decoded_image = self.decoder(latent_vector)
-        self.show_decoded_image(decoded_image)
+        if self.visualize:
+            self.show_closest_image(closest_image)
+            self.show_decoded_image(decoded_image)
         return self.wrap(image, latent_vector, closest_image, decoded_image)
 
 
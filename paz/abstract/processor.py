@@ -104,10 +104,11 @@ class SequentialProcessor(object):
         self.processors.append(processor)
 
     def __call__(self, *args, **kwargs):
+        processors = iter(self.processors)
         # first call can take list or dictionary values.
-        args = self.processors[0](*args, **kwargs)
+        args = next(processors)(*args, **kwargs)
         # further calls can be a tuple or single values.
-        for processor in self.processors[1:]:
+        for processor in processors:
             if isinstance(args, tuple):
                 args = processor(*args)
             else:
@@ -1,13 +1,21 @@
 import numpy as np
 
+# maximum number of (box_A, box_B) pairs evaluated at once by
+# ``compute_ious``; larger problems are tiled into row blocks
+MAX_PAIRWISE_BLOCK_SIZE = 2 ** 24
 
-def compute_iou(box, boxes):
+
+def compute_iou(box, boxes, boxes_areas=None):
     """Calculates the intersection over union between 'box' and all 'boxes'.
     Both `box` and `boxes` are in corner coordinates.
 
     # Arguments
         box: Numpy array with length at least of 4.
         boxes: Numpy array with shape `(num_boxes, 4)`.
+        boxes_areas: Numpy array of shape `(num_boxes)` with the
+            precomputed areas of `boxes`, or `None` to compute them.
+            Passing them in amortizes the area computation when `boxes`
+            is re-used across calls e.g. a fixed prior box set.
 
     # Returns
         Numpy array of shape `(num_boxes, 1)`.
@@ -21,11 +29,15 @@ def compute_iou(box, boxes):
     inner_y_min = np.maximum(y_min_B, y_min_A)
     inner_x_max = np.minimum(x_max_B, x_max_A)
     inner_y_max = np.minimum(y_max_B, y_max_A)
-    inner_w = np.maximum((inner_x_max - inner_x_min), 0)
-    inner_h = np.maximum((inner_y_max - inner_y_min), 0)
-    intersection_area = inner_w * inner_h
+    inner_w = np.subtract(inner_x_max, inner_x_min, out=inner_x_max)
+    np.maximum(inner_w, 0, out=inner_w)
+    inner_h = np.subtract(inner_y_max, inner_y_min, out=inner_y_max)
+    np.maximum(inner_h, 0, out=inner_h)
+    intersection_area = np.multiply(inner_w, inner_h, out=inner_w)
     # calculating the union
-    box_area_B = (x_max_B - x_min_B) * (y_max_B - y_min_B)
+    if boxes_areas is None:
+        boxes_areas = (x_max_B - x_min_B) * (y_max_B - y_min_B)
+    box_area_B = boxes_areas
     box_area_A = (x_max_A - x_min_A) * (y_max_A - y_min_A)
     union_area = box_area_A + box_area_B - intersection_area
     intersection_over_union = intersection_area / union_area
@@ -47,7 +59,41 @@ def compute_ious(boxes_A, boxes_B):
     # Returns
         Numpy array of shape `(num_boxes_A, num_boxes_B)`.
     """
-    return np.apply_along_axis(compute_iou, 1, boxes_A, boxes_B)
+    if len(boxes_A) * len(boxes_B) > MAX_PAIRWISE_BLOCK_SIZE:
+        block_size = max(1, MAX_PAIRWISE_BLOCK_SIZE // len(boxes_B))
+        # tiling can only shrink the problem along the rows of `boxes_A`;
+        # when `boxes_B` alone exceeds the budget fall through to the
+        # direct computation instead of recursing on identical arguments
+        if block_size < len(boxes_A):
+            ious = None
+            for block_arg in range(0, len(boxes_A), block_size):
+                block = compute_ious(
+                    boxes_A[block_arg:block_arg + block_size], boxes_B)
+                if ious is None:
+                    ious = np.empty(
+                        (len(boxes_A), len(boxes_B)), block.dtype)
+                ious[block_arg:block_arg + block_size] = block
+            return ious
+    # contiguous coordinate columns so the broadcasts read unit-stride memory
+    x_min_A = np.ascontiguousarray(boxes_A[:, 0:1])
+    y_min_A = np.ascontiguousarray(boxes_A[:, 1:2])
+    x_max_A = np.ascontiguousarray(boxes_A[:, 2:3])
+    y_max_A = np.ascontiguousarray(boxes_A[:, 3:4])
+    x_min_B = np.ascontiguousarray(boxes_B[:, 0])
+    y_min_B = np.ascontiguousarray(boxes_B[:, 1])
+    x_max_B = np.ascontiguousarray(boxes_B[:, 2])
+    y_max_B = np.ascontiguousarray(boxes_B[:, 3])
+    areas_A = (x_max_A - x_min_A) * (y_max_A - y_min_A)
+    areas_B = (x_max_B - x_min_B) * (y_max_B - y_min_B)
+    # calculating the intersection for all pairs by broadcasting
+    inner_w = np.minimum(x_max_A, x_max_B) - np.maximum(x_min_A, x_min_B)
+    np.maximum(inner_w, 0, out=inner_w)
+    inner_h = np.minimum(y_max_A, y_max_B) - np.maximum(y_min_A, y_min_B)
+    np.maximum(inner_h, 0, out=inner_h)
+    intersection_area = np.multiply(inner_w, inner_h, out=inner_w)
+    # calculating the union for all pairs
+    union_area = areas_A + areas_B - intersection_area
+    return intersection_area / union_area
 
 
 def to_point_form(boxes):
@@ -60,13 +106,14 @@ def to_point_form(boxes):
         Numpy array with shape `(num_boxes, 4)`.
     """
     center_x, center_y = boxes[:, 0], boxes[:, 1]
-    width, height = boxes[:, 2], boxes[:, 3]
-    x_min = center_x - (width / 2.0)
-    x_max = center_x + (width / 2.0)
-    y_min = center_y - (height / 2.0)
-    y_max = center_y + (height / 2.0)
-    return np.concatenate([x_min[:, None], y_min[:, None],
-                           x_max[:, None], y_max[:, None]], axis=1)
+    half_width = boxes[:, 2] / 2.0
+    half_height = boxes[:, 3] / 2.0
+    point_form_boxes = np.empty_like(boxes, dtype=half_width.dtype)
+    point_form_boxes[:, 0] = center_x - half_width
+    point_form_boxes[:, 1] = center_y - half_height
+    point_form_boxes[:, 2] = center_x + half_width
+    point_form_boxes[:, 3] = center_y + half_height
+    return point_form_boxes
 
 
 def to_center_form(boxes):
@@ -82,10 +129,12 @@ def to_center_form(boxes):
     x_max, y_max = boxes[:, 2], boxes[:, 3]
     center_x = (x_max + x_min) / 2.
     center_y = (y_max + y_min) / 2.
-    width = x_max - x_min
-    height = y_max - y_min
-    return np.concatenate([center_x[:, None], center_y[:, None],
-                           width[:, None], height[:, None]], axis=1)
+    center_form_boxes = np.empty_like(boxes, dtype=center_x.dtype)
+    center_form_boxes[:, 0] = center_x
+    center_form_boxes[:, 1] = center_y
+    center_form_boxes[:, 2] = x_max - x_min
+    center_form_boxes[:, 3] = y_max - y_min
+    return center_form_boxes
 
 
 def encode(matched, priors, variances):
@@ -103,15 +152,23 @@ def encode(matched, priors, variances):
         encoded boxes: Numpy array of shape `(num_priors, 4)`.
     """
 
+    encoded_boxes = np.empty_like(matched)
     # dist b/t match center and prior's center
-    g_cxcy = (matched[:, :2] + matched[:, 2:4]) / 2.0 - priors[:, :2]
+    np.add(matched[:, :2], matched[:, 2:4], out=encoded_boxes[:, :2])
+    encoded_boxes[:, :2] /= 2.0
+    encoded_boxes[:, :2] -= priors[:, :2]
     # encode variance
-    g_cxcy /= (variances[0] * priors[:, 2:4])
+    encoded_boxes[:, :2] /= variances[0] * priors[:, 2:4]
     # match wh / prior wh
-    g_wh = (matched[:, 2:4] - matched[:, :2]) / priors[:, 2:4]
-    g_wh = np.log(np.abs(g_wh) + 1e-4) / variances[1]
+    np.subtract(matched[:, 2:4], matched[:, :2], out=encoded_boxes[:, 2:4])
+    encoded_boxes[:, 2:4] /= priors[:, 2:4]
+    np.abs(encoded_boxes[:, 2:4], out=encoded_boxes[:, 2:4])
+    encoded_boxes[:, 2:4] += 1e-4
+    np.log(encoded_boxes[:, 2:4], out=encoded_boxes[:, 2:4])
+    encoded_boxes[:, 2:4] /= variances[1]
+    encoded_boxes[:, 4:] = matched[:, 4:]
     # return target for smooth_l1_loss
-    return np.concatenate([g_cxcy, g_wh, matched[:, 4:]], 1)  # [num_priors,4]
+    return encoded_boxes  # [num_priors, 4 + 1]
 
 
 def decode(predictions, priors, variances):
@@ -126,12 +183,15 @@ def decode(predictions, priors, variances):
         decoded boxes: Numpy array of shape `(num_priors, 4)`.
     """
 
-    boxes = np.concatenate((
-        priors[:, :2] + predictions[:, :2] * variances[0] * priors[:, 2:4],
-        priors[:, 2:4] * np.exp(predictions[:, 2:4] * variances[1])), 1)
-    boxes[:, :2] = boxes[:, :2] - (boxes[:, 2:4] / 2.0)
-    boxes[:, 2:4] = boxes[:, 2:4] + boxes[:, :2]
-    return np.concatenate([boxes, predictions[:, 4:]], 1)
+    boxes = np.empty_like(predictions)
+    centers = predictions[:, :2] * variances[0] * priors[:, 2:4]
+    centers += priors[:, :2]
+    half_sides = np.exp(predictions[:, 2:4] * variances[1])
+    half_sides *= priors[:, 2:4]
+    half_sides /= 2.0
+    np.subtract(centers, half_sides, out=boxes[:, :2])
+    np.add(centers, half_sides, out=boxes[:, 2:4])
+    boxes[:, 4:] = predictions[:, 4:]
     return boxes
 
 
@@ -147,8 +207,10 @@ def reversed_argmax(array, axis):
     # Returns
         index_array : Numpy array of ints.
     """
-    array_flip = np.flip(array, axis=axis)
-    return array.shape[axis] - np.argmax(array_flip, axis=axis) - 1
+    reversed_slices = [slice(None)] * array.ndim
+    reversed_slices[axis] = slice(None, None, -1)
+    reversed_view = array[tuple(reversed_slices)]
+    return array.shape[axis] - np.argmax(reversed_view, axis=axis) - 1
 
 
 def match(boxes, prior_boxes, iou_threshold=0.5):
@@ -173,7 +235,11 @@ def match(boxes, prior_boxes, iou_threshold=0.5):
             form box coordinates and the last coordinates is the class
             argument.
     """
-    ious = compute_ious(boxes, to_point_form(np.float32(prior_boxes)))
+    prior_boxes = np.asarray(prior_boxes, dtype=np.float32)
+    # IoU values only feed reductions and a threshold compare, so the
+    # matrix is computed in single precision to halve its memory traffic
+    box_coordinates = np.ascontiguousarray(boxes[:, :4], dtype=np.float32)
+    ious = compute_ious(box_coordinates, to_point_form(prior_boxes))
     best_box_iou_per_prior_box = np.max(ious, axis=0)
 
     best_box_arg_per_prior_box = reversed_argmax(ious, 0)
@@ -181,9 +247,8 @@ def match(boxes, prior_boxes, iou_threshold=0.5):
 
     best_box_iou_per_prior_box[best_prior_box_arg_per_box] = 2
     # overwriting best_box_arg_per_prior_box if they are the best prior box
-    for box_arg in range(len(best_prior_box_arg_per_box)):
-        best_prior_box_arg = best_prior_box_arg_per_box[box_arg]
-        best_box_arg_per_prior_box[best_prior_box_arg] = box_arg
+    best_box_arg_per_prior_box[best_prior_box_arg_per_box] = np.arange(
+        len(best_prior_box_arg_per_box))
     matches = boxes[best_box_arg_per_prior_box]
     # setting class value to 0 (background argument)
     matches[best_box_iou_per_prior_box < iou_threshold, 4] = 0
@@ -304,9 +369,9 @@ def to_one_hot(class_indices, num_classes):
     # Returns
         Numpy array with shape `(num_samples, num_classes)`.
     """
+    class_indices = np.asarray(class_indices, dtype=np.intp)
     one_hot_vectors = np.zeros((len(class_indices), num_classes))
-    for vector_arg, class_args in enumerate(class_indices):
-        one_hot_vectors[vector_arg, class_args] = 1.0
+    one_hot_vectors[np.arange(len(class_indices)), class_indices] = 1.0
     return one_hot_vectors
 
 
@@ -339,6 +404,30 @@ def make_box_square(box):
     return x_min, y_min, x_max, y_max
 
 
+def make_boxes_square(boxes):
+    """Makes box coordinates square with sides equal to the longest original
+    side for every box in ``boxes``.
+
+    # Arguments
+        boxes: Numpy array of shape `(num_boxes, 4)` with point corner
+            coordinates.
+
+    # Returns
+        Numpy array of ints with shape `(num_boxes, 4)`.
+    """
+    boxes = np.asarray(boxes)
+    center_x = (boxes[:, 2] + boxes[:, 0]) / 2.0
+    center_y = (boxes[:, 3] + boxes[:, 1]) / 2.0
+    half_sides = np.maximum(
+        boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]) / 2.0
+    square_boxes = np.empty((len(boxes), 4), dtype=int)
+    square_boxes[:, 0] = center_x - half_sides
+    square_boxes[:, 1] = center_y - half_sides
+    square_boxes[:, 2] = center_x + half_sides
+    square_boxes[:, 3] = center_y + half_sides
+    return square_boxes
+
+
 def offset(coordinates, offset_scales):
     """Apply offsets to box coordinates
 
@@ -361,6 +450,29 @@ def offset(coordinates, offset_scales):
     return (x_min, y_min, x_max, y_max)
 
 
+def offset_boxes(boxes, offset_scales):
+    """Apply offsets to the box coordinates of every box in ``boxes``.
+
+    # Arguments
+        boxes: Numpy array of shape `(num_boxes, 4)` with point corner
+            coordinates.
+        offset_scales: List of floats having x and y scales respectively.
+
+    # Returns
+        Numpy array of ints with shape `(num_boxes, 4)`.
+    """
+    boxes = np.asarray(boxes)
+    x_offset_scale, y_offset_scale = offset_scales
+    x_offsets = (boxes[:, 2] - boxes[:, 0]) * x_offset_scale
+    y_offsets = (boxes[:, 3] - boxes[:, 1]) * y_offset_scale
+    boxes_with_offset = np.empty((len(boxes), 4), dtype=int)
+    boxes_with_offset[:, 0] = boxes[:, 0] - x_offsets
+    boxes_with_offset[:, 1] = boxes[:, 1] - y_offsets
+    boxes_with_offset[:, 2] = boxes[:, 2] + y_offsets
+    boxes_with_offset[:, 3] = boxes[:, 3] + x_offsets
+    return boxes_with_offset
+
+
 def clip(coordinates, image_shape):
     """Clip box to valid image coordinates
     # Arguments
@@ -17,12 +17,11 @@ def normalize_keypoints(keypoints, height, width):
         Numpy array of shape ``(num_keypoints, 2)``.
     """
     normalized_keypoints = np.zeros_like(keypoints, dtype=np.float32)
-    for keypoint_arg, keypoint in enumerate(keypoints):
-        x, y = keypoint[:2]
-        # transform key-point coordinates to image coordinates
-        x = (((x + 0.5) - (width / 2.0)) / (width / 2))
-        y = (((height - 0.5 - y) - (height / 2.0)) / (height / 2))
-        normalized_keypoints[keypoint_arg][:2] = [x, y]
+    x, y = keypoints[:, 0], keypoints[:, 1]
+    # transform key-point coordinates to image coordinates
+    normalized_keypoints[:, 0] = ((x + 0.5) - (width / 2.0)) / (width / 2)
+    normalized_keypoints[:, 1] = (
+        (height - 0.5 - y) - (height / 2.0)) / (height / 2)
     return normalized_keypoints
 
 
@@ -37,14 +36,14 @@ def denormalize_keypoints(keypoints, height, width):
     # Returns
         Numpy array of shape ``(num_keypoints, 2)``.
     """
-    for keypoint_arg, keypoint in enumerate(keypoints):
-        x, y = keypoint[:2]
-        # transform key-point coordinates to image coordinates
-        x = (min(max(x, -1), 1) * width / 2 + width / 2) - 0.5
-        # flip since the image coordinates for y are flipped
-        y = height - 0.5 - (min(max(y, -1), 1) * height / 2 + height / 2)
-        x, y = int(round(x)), int(round(y))
-        keypoints[keypoint_arg][:2] = [x, y]
+    x = np.clip(keypoints[:, 0], -1, 1)
+    y = np.clip(keypoints[:, 1], -1, 1)
+    # transform key-point coordinates to image coordinates
+    x = (x * width / 2 + width / 2) - 0.5
+    # flip since the image coordinates for y are flipped
+    y = height - 0.5 - (y * height / 2 + height / 2)
+    keypoints[:, 0] = np.round(x)
+    keypoints[:, 1] = np.round(y)
     return keypoints
 
 
@@ -1,9 +1,191 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
 import numpy as np
-from ..backend.boxes import compute_ious
+from ..backend.boxes import compute_iou, compute_ious
 from ..backend.image import load_image
 
 
-def compute_matches(dataset, detector, class_to_arg, iou_thresh=0.5):
+def match_class(predicted_boxes, ground_truth_boxes, difficulties,
+                iou_thresh=0.5):
+    """Matches score-sorted class predictions against class ground truths.
+    Arguments:
+        predicted_boxes: Numpy array of shape ``(N, 4)`` sorted by
+            descending score.
+        ground_truth_boxes: Numpy array of shape ``(M, 4)``.
+        difficulties: Boolean numpy array of shape ``(M)``.
+        iou_thresh (float): A prediction is correct if its Intersection over
+            Union with the ground truth is above this value..
+
+    Returns:
+        match_values: Int numpy array of shape ``(N)`` with ``1`` for true
+            positives, ``0`` for false positives and ``-1`` for matches to
+            difficult ground truth boxes.
+    """
+    # evaluation on VOC follows integer typed bounding boxes with the +1
+    # endpoint convention; int32 keeps min/max on the integer SIMD path
+    predicted_boxes = predicted_boxes.astype(np.int32)
+    predicted_boxes[:, 2:] = predicted_boxes[:, 2:] + 1
+    ground_truth_boxes = ground_truth_boxes.astype(np.int32)
+    ground_truth_boxes[:, 2:] = ground_truth_boxes[:, 2:] + 1
+
+    if len(ground_truth_boxes) == 1:
+        # a single ground truth makes the argmax trivial; the 1-D IoU
+        # vector sidesteps building an (N, 1) matrix
+        ground_truth_ious = compute_iou(
+            ground_truth_boxes[0], predicted_boxes)
+        ground_truth_args = np.zeros(len(predicted_boxes), dtype=np.int64)
+    else:
+        ious = compute_ious(predicted_boxes, ground_truth_boxes)
+        ground_truth_args = ious.argmax(axis=1)
+        # gathering the maxima at the argmax positions avoids traversing
+        # the full IoU matrix a second time with ``ious.max(axis=1)``
+        ground_truth_ious = np.take_along_axis(
+            ious, ground_truth_args[:, None], axis=1)[:, 0]
+    # set -1 if there is no matching ground truth
+    ground_truth_args[ground_truth_ious < iou_thresh] = -1
+    matched_mask = ground_truth_args >= 0
+    if difficulties.all():
+        # every matched prediction hits a difficult ground truth, so all
+        # of them are ignored and the first-match deduplication is moot;
+        # unmatched predictions remain false positives either way
+        match_values = np.zeros(len(ground_truth_args), dtype=np.int8)
+        match_values[matched_mask] = -1
+        return match_values
+    difficult_mask = np.zeros(len(ground_truth_args), dtype=bool)
+    difficult_mask[matched_mask] = difficulties[
+        ground_truth_args[matched_mask]]
+    match_values = np.zeros(len(ground_truth_args), dtype=np.int8)
+    # matches to difficult ground truth boxes are ignored
+    match_values[difficult_mask] = -1
+    # predictions are sorted by score, thus the first prediction
+    # matched to each easy ground truth box is the true positive
+    easy_args = np.flatnonzero(matched_mask & ~difficult_mask)
+    first_match_args = np.unique(
+        ground_truth_args[easy_args], return_index=True)[1]
+    match_values[easy_args[first_match_args]] = 1
+    return match_values
+
+
+def get_predictions(results, class_to_arg):
+    """Extracts typed prediction arrays from inference results.
+    Arguments:
+        results: Dict. with inferred 'boxes2D'.
+        class_to_arg: Dict. of class names and their id
+
+    Returns:
+        predicted_boxes: Float numpy array of shape ``(num_boxes, 4)``.
+        predicted_class_args: Int numpy array of shape ``(num_boxes)``.
+        predicted_scores: Float numpy array of shape ``(num_boxes)``.
+    """
+    boxes2D = results['boxes2D']
+    num_boxes = len(boxes2D)
+    predicted_boxes = np.empty((num_boxes, 4), dtype=np.float32)
+    predicted_scores = np.empty(num_boxes, dtype=np.float32)
+    class_names = [None] * num_boxes
+    for box_arg, box2D in enumerate(boxes2D):
+        predicted_boxes[box_arg] = box2D.coordinates
+        predicted_scores[box_arg] = box2D.score
+        class_names[box_arg] = box2D.class_name
+    predicted_class_args = np.fromiter(
+        (class_to_arg[name] for name in class_names),
+        dtype=np.int32, count=num_boxes)
+    return predicted_boxes, predicted_class_args, predicted_scores
+
+
+def compute_sample_matches(sample, detector, class_to_arg, iou_thresh=0.5,
+                           image=None, results=None):
+    """Computes detection matches for a single dataset sample.
+    Arguments:
+        sample: Dict. containing 'image' and 'boxes' as keys and
+            optionally 'difficulties'.
+        detector : Function for performing inference
+        class_to_arg: Dict. of class names and their id
+        iou_thresh (float): A prediction is correct if its Intersection over
+            Union with the ground truth is above this value..
+        image: Numpy array with the already loaded sample image, or None
+            to load it from ``sample['image']``.
+        results: Dict. with already inferred 'boxes2D', or None to run
+            ``detector`` on the sample image.
+
+    Returns:
+        num_positives: Dict. with number of positives per present class
+        score: Dict. with matching scores of boxes per present class
+        match: Dict. with match/non-match info of boxes per present class
+    """
+    num_positives, score, match = {}, {}, {}
+    # obtaining ground truths in float32; copy=False semantics keep the
+    # intake allocation-free when the dataset already stores float32
+    ground_truth_boxes = np.ascontiguousarray(
+        sample['boxes'][:, :4], dtype=np.float32)
+    ground_truth_class_args = sample['boxes'][:, 4].astype(
+        np.int32, copy=False)
+    if 'difficulties' in sample.keys():
+        difficulties = np.asarray(sample['difficulties'])
+    else:
+        difficulties = None
+    # obtaining predictions
+    if results is None:
+        if image is None:
+            image = load_image(sample['image'])
+        results = detector(image)
+    predicted_boxes, predicted_class_args, predicted_scores = (
+        get_predictions(results, class_to_arg))
+    # setting difficulties to ``Easy`` if they are None
+    if difficulties is None:
+        difficulties = np.zeros(len(ground_truth_boxes), dtype=bool)
+    # sorting predictions once by class and descending score, and ground
+    # truths once by class, so every class is a contiguous segment
+    prediction_order = np.lexsort((-predicted_scores, predicted_class_args))
+    predicted_boxes = predicted_boxes[prediction_order]
+    predicted_class_args = predicted_class_args[prediction_order]
+    predicted_scores = predicted_scores[prediction_order]
+    ground_truth_order = np.argsort(ground_truth_class_args, kind='stable')
+    ground_truth_boxes = ground_truth_boxes[ground_truth_order]
+    ground_truth_class_args = ground_truth_class_args[ground_truth_order]
+    difficulties = difficulties[ground_truth_order]
+    # iterating over each class present in the image; counting occurrences
+    # with bincount finds the present classes without the sort in np.unique
+    class_counts = np.bincount(np.concatenate(
+        (predicted_class_args, ground_truth_class_args)).astype(np.int32))
+    class_args = np.flatnonzero(class_counts)
+    for class_arg in class_args:
+        num_positives[class_arg] = 0
+        score[class_arg], match[class_arg] = [], []
+        # slicing the contiguous class segment of the sorted predictions
+        prediction_span = np.searchsorted(
+            predicted_class_args, [class_arg, class_arg + 1])
+        class_predicted_boxes = predicted_boxes[slice(*prediction_span)]
+        class_predicted_scores = predicted_scores[slice(*prediction_span)]
+        # slicing the contiguous class segment of the sorted ground truths
+        ground_truth_span = np.searchsorted(
+            ground_truth_class_args, [class_arg, class_arg + 1])
+        class_ground_truth_boxes = ground_truth_boxes[
+            slice(*ground_truth_span)]
+        class_difficulties = difficulties[slice(*ground_truth_span)]
+        # the number of positives equals the number of easy boxes
+        num_easy = np.logical_not(class_difficulties).sum()
+        num_positives[class_arg] = num_positives[class_arg] + num_easy
+        # if not predicted boxes for this class continue
+        if len(class_predicted_boxes) == 0:
+            continue
+        # score and match runs are appended in tandem so they stay aligned
+        score[class_arg].append(class_predicted_scores)
+        # if not ground truth boxes continue but add zeros as matches
+        if len(class_ground_truth_boxes) == 0:
+            match[class_arg].append(
+                np.zeros(len(class_predicted_boxes), dtype=np.int8))
+            continue
+        match_values = match_class(
+            class_predicted_boxes, class_ground_truth_boxes,
+            class_difficulties, iou_thresh)
+        match[class_arg].append(match_values)
+    return num_positives, score, match
+
+
+def compute_matches(dataset, detector, class_to_arg, iou_thresh=0.5,
+                    num_workers=1, batch_size=1):
     """
     Arguments:
         dataset: List of dictionaries containing 'image' as key and a
@@ -12,104 +194,124 @@ def compute_matches(dataset, detector, class_to_arg, iou_thresh=0.5):
         class_to_arg: Dict. of class names and their id
         iou_thresh (float): A prediction is correct if its Intersection over
             Union with the ground truth is above this value..
+        num_workers (int): Number of threads evaluating samples
+            concurrently. The default of 1 keeps the sequential behavior;
+            values above 1 require a thread-safe ``detector``.
+        batch_size (int): Number of images inferred per detector call.
+            Values above 1 require a ``detector`` that takes a list of
+            images and returns a list of results.
 
     Returns:
         num_positives: Dict. containing number of positives for each class
         score: Dict. containing matching scores of boxes for each class
         match: Dict. containing match/non-match info of boxes in each class
     """
-    # classes_count = len(np.unique(np.concatenate(ground_truth_class_args)))
     num_classes = len(class_to_arg)
     num_positives = {label_id: 0 for label_id in range(1, num_classes + 1)}
     score = {label_id: [] for label_id in range(1, num_classes + 1)}
     match = {label_id: [] for label_id in range(1, num_classes + 1)}
-    for sample in dataset:
-        # obtaining ground truths
-        ground_truth_boxes = np.array(sample['boxes'][:, :4])
-        ground_truth_class_args = np.array(sample['boxes'][:, 4])
-        if 'difficulties' in sample.keys():
-            difficulties = np.array(sample['difficulties'])
-        else:
-            difficulties = None
-        # obtaining predictions
-        image = load_image(sample['image'])
-        results = detector(image)
-        predicted_boxes, predicted_class_args, predicted_scores = [], [], []
-        for box2D in results['boxes2D']:
-            predicted_scores.append(box2D.score)
-            predicted_class_args.append(class_to_arg[box2D.class_name])
-            predicted_boxes.append(list(box2D.coordinates))
-        predicted_boxes = np.array(predicted_boxes, dtype=np.float32)
-        predicted_class_args = np.array(predicted_class_args)
-        predicted_scores = np.array(predicted_scores, dtype=np.float32)
-        # setting difficulties to ``Easy`` if they are None
-        if difficulties is None:
-            difficulties = np.zeros(len(ground_truth_boxes), dtype=bool)
-        # iterating over each class present in the image
-        class_args = np.concatenate(
-            (predicted_class_args, ground_truth_class_args))
-        class_args = np.unique(class_args).astype(int)
-        for class_arg in class_args:
-            # masking predictions by class
-            class_mask = class_arg == predicted_class_args
-            class_predicted_boxes = predicted_boxes[class_mask]
-            class_predicted_scores = predicted_scores[class_mask]
-            # sort score from maximum to minimum for masked predictions
-            sorted_args = class_predicted_scores.argsort()[::-1]
-            class_predicted_boxes = class_predicted_boxes[sorted_args]
-            class_predicted_scores = class_predicted_scores[sorted_args]
-            # masking ground truths by class
-            class_mask = class_arg == ground_truth_class_args
-            class_ground_truth_boxes = ground_truth_boxes[class_mask]
-            class_difficulties = difficulties[class_mask]
-            # the number of positives equals the number of easy boxes
-            num_easy = np.logical_not(class_difficulties).sum()
-            num_positives[class_arg] = num_positives[class_arg] + num_easy
-            # add all predicted scores to scores
-            score[class_arg].extend(class_predicted_scores)
-            # if not predicted boxes for this class continue
-            if len(class_predicted_boxes) == 0:
-                continue
-            # if not ground truth boxes continue but add zeros as matches
-            if len(class_ground_truth_boxes) == 0:
-                match[class_arg].extend((0,) * len(class_predicted_boxes))
-                continue
-
-            # evaluation on VOC follows integer typed bounding boxes.
-            class_predicted_boxes = class_predicted_boxes.copy()
-            class_predicted_boxes[:, 2:] = (
-                class_predicted_boxes[:, 2:] + 1)
-            class_ground_truth_boxes = class_ground_truth_boxes.copy()
-            class_ground_truth_boxes[:, 2:] = (
-                class_ground_truth_boxes[:, 2:] + 1)
-
-            ious = compute_ious(
-                class_predicted_boxes, class_ground_truth_boxes)
-            ground_truth_args = ious.argmax(axis=1)
-            # set -1 if there is no matching ground truth
-            ground_truth_args[ious.max(axis=1) < iou_thresh] = -1
-            selected = np.zeros(len(class_ground_truth_boxes), dtype=bool)
-            for ground_truth_arg in ground_truth_args:
-                if ground_truth_arg >= 0:
-                    if class_difficulties[ground_truth_arg]:
-                        match[class_arg].append(-1)
-                    else:
-                        if not selected[ground_truth_arg]:
-                            match[class_arg].append(1)
-                        else:
-                            match[class_arg].append(0)
-                    selected[ground_truth_arg] = True
-                else:
-                    match[class_arg].append(0)
+    compute_sample = partial(compute_sample_matches, detector=detector,
+                             class_to_arg=class_to_arg,
+                             iou_thresh=iou_thresh)
+    if batch_size > 1:
+        sample_matches = []
+        for batch_arg in range(0, len(dataset), batch_size):
+            batch = dataset[batch_arg:batch_arg + batch_size]
+            images = [load_image(sample['image']) for sample in batch]
+            batch_results = detector(images)
+            for sample, results in zip(batch, batch_results):
+                sample_matches.append(
+                    compute_sample(sample, results=results))
+    elif num_workers > 1:
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            sample_matches = list(executor.map(compute_sample, dataset))
+    else:
+        # a single background thread prefetches upcoming images so that
+        # disk reads and decoding overlap with detector inference
+        num_prefetch = min(4, len(dataset))
+        sample_matches = []
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            images = deque(
+                executor.submit(load_image, sample['image'])
+                for sample in dataset[:num_prefetch])
+            for sample_arg, sample in enumerate(dataset):
+                prefetch_arg = sample_arg + num_prefetch
+                if prefetch_arg < len(dataset):
+                    images.append(executor.submit(
+                        load_image, dataset[prefetch_arg]['image']))
+                sample_matches.append(compute_sample(
+                    sample, image=images.popleft().result()))
+    for sample_positives, sample_score, sample_match in sample_matches:
+        for class_arg in sample_positives:
+            num_positives[class_arg] = (
+                num_positives[class_arg] + sample_positives[class_arg])
+            score[class_arg].extend(sample_score[class_arg])
+            match[class_arg].extend(sample_match[class_arg])
     return num_positives, score, match
 
 
+def merge_sorted_runs(scores_A, matches_A, scores_B, matches_B):
+    """Merges two ascending score runs and their aligned matches.
+    Arguments:
+        scores_A: Ascending numpy array of shape ``(N)``.
+        matches_A: Numpy array of shape ``(N)`` aligned with ``scores_A``.
+        scores_B: Ascending numpy array of shape ``(M)``.
+        matches_B: Numpy array of shape ``(M)`` aligned with ``scores_B``.
+
+    Returns:
+        merged_scores: Ascending numpy array of shape ``(N + M)``.
+        merged_matches: Numpy array of shape ``(N + M)``.
+    """
+    # each element lands at its own run offset plus the number of
+    # elements of the other run that sort before it
+    positions_A = np.arange(len(scores_A)) + np.searchsorted(
+        scores_B, scores_A, side='left')
+    positions_B = np.arange(len(scores_B)) + np.searchsorted(
+        scores_A, scores_B, side='right')
+    merged_scores = np.empty(
+        len(scores_A) + len(scores_B), dtype=scores_A.dtype)
+    merged_matches = np.empty(len(merged_scores), dtype=matches_A.dtype)
+    merged_scores[positions_A] = scores_A
+    merged_scores[positions_B] = scores_B
+    merged_matches[positions_A] = matches_A
+    merged_matches[positions_B] = matches_B
+    return merged_scores, merged_matches
+
+
+def merge_score_runs(score_runs, match_runs):
+    """Merges descending per-image score runs into one sorted array pair.
+    Arguments:
+        score_runs: List of descending-sorted numpy score arrays.
+        match_runs: List of numpy match arrays aligned with ``score_runs``.
+
+    Returns:
+        merged_scores: Descending numpy array with all scores.
+        merged_matches: Numpy array with the correspondingly ordered matches.
+    """
+    if len(score_runs) == 0:
+        return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int8)
+    runs = [(scores[::-1], matches[::-1])
+            for scores, matches in zip(score_runs, match_runs)]
+    # tournament of pairwise merges: O(total * log(num_runs)) instead of
+    # re-sorting the full concatenation from scratch
+    while len(runs) > 1:
+        merged_runs = []
+        for run_arg in range(0, len(runs) - 1, 2):
+            merged_runs.append(merge_sorted_runs(
+                *runs[run_arg], *runs[run_arg + 1]))
+        if len(runs) % 2 == 1:
+            merged_runs.append(runs[-1])
+        runs = merged_runs
+    merged_scores, merged_matches = runs[0]
+    return merged_scores[::-1], merged_matches[::-1]
+
+
 def calculate_relevance_metrics(num_positives, scores, matches):
     """Calculates precision and recall.
     Arguments:
         num_positives: Dict. with number of positives for each class
-        scores: Dict. with matching scores of boxes for each class
-        matches: Dict. wth match/non-match info for boxes for each class
+        scores: Dict. with lists of descending-sorted score runs per class
+        matches: Dict. with lists of aligned match runs per class
     Returns:
         precision: Dict. with precision values per class
         recall : Dict. with recall values per class
@@ -117,12 +319,18 @@ def calculate_relevance_metrics(num_positives, scores, matches):
     num_classes = max(num_positives.keys()) + 1
     precision, recall = [None] * num_classes, [None] * num_classes
     for class_arg in num_positives.keys():
-        class_positive_matches = np.array(matches[class_arg], dtype=np.int8)
-        class_scores = np.array(scores[class_arg])
-        order = class_scores.argsort()[::-1]
-        class_positive_matches = class_positive_matches[order]
-        true_positives = np.cumsum(class_positive_matches == 1)
-        false_positives = np.cumsum(class_positive_matches == 0)
+        # the per-image runs are already score-sorted, so merging them is
+        # cheaper than argsorting the full concatenation
+        class_scores, class_positive_matches = merge_score_runs(
+            scores[class_arg], matches[class_arg])
+        # with matches in {-1, 0, 1} the running sum and running absolute
+        # sum recover both counts without materializing boolean masks:
+        # true positives contribute to both, ignored matches cancel out
+        match_sum = np.cumsum(class_positive_matches)
+        match_abs_sum = np.cumsum(np.abs(class_positive_matches))
+        true_positives = (match_abs_sum + match_sum) // 2
+        false_positives = (
+            np.arange(1, len(class_positive_matches) + 1) - match_abs_sum)
         precision[class_arg] = (
             true_positives / (false_positives + true_positives))
         if num_positives[class_arg] > 0:
@@ -146,27 +354,29 @@ def calculate_average_precisions(precision, recall, use_07_metric=False):
             average_precisions[class_arg] = np.nan
             continue
 
+        # precision is only NaN while no prediction has been counted e.g.
+        # a prefix of ignored matches, so the copy is usually redundant
+        class_precision = precision[class_arg]
+        if np.isnan(class_precision).any():
+            class_precision = np.nan_to_num(class_precision)
+
         if use_07_metric:
             # 11 point metric
-            average_precisions[class_arg] = 0
-            for t in np.arange(0., 1.1, 0.1):
-                if np.sum(recall[class_arg] >= t) == 0:
-                    p_interpolation = 0
-                else:
-                    p_interpolation = np.max(
-                        np.nan_to_num(
-                            precision[class_arg]
-                        )[recall[class_arg] >= t]
-                    )
-                average_precision_class = average_precisions[class_arg]
-                average_precision_class = (average_precision_class +
-                                           (p_interpolation / 11))
-                average_precisions[class_arg] = average_precision_class
+            if len(recall[class_arg]) == 0:
+                average_precisions[class_arg] = 0
+                continue
+            # masking precision against every recall threshold at once and
+            # taking the row-wise maxima interpolates all 11 points
+            thresholds = np.arange(0., 1.1, 0.1)
+            interpolations = (
+                class_precision *
+                (recall[class_arg] >= thresholds[:, None])).max(axis=1)
+            average_precisions[class_arg] = interpolations.mean()
 
         else:
             # first append sentinel values at the end
             average_precision = np.concatenate(
-                ([0], np.nan_to_num(precision[class_arg]), [0]))
+                ([0], class_precision, [0]))
             average_recall = np.concatenate(([0], recall[class_arg], [1]))
 
             average_precision = np.maximum.accumulate(
@@ -186,7 +396,7 @@ def calculate_average_precisions(precision, recall, use_07_metric=False):
 
 
 def evaluateMAP(detector, dataset, class_to_arg, iou_thresh=0.5,
-                use_07_metric=False):
+                use_07_metric=False, num_workers=1, batch_size=1):
     """Calculate average precisions based on evaluation code of PASCAL VOC.
     Arguments:
         dataset: List of dictionaries containing 'image' as key and a
@@ -195,10 +405,17 @@ def evaluateMAP(detector, dataset, class_to_arg, iou_thresh=0.5,
         class_to_arg: Dict. of class names and their id
         iou_thresh: Float indicating intersection over union threshold for
             assigning a prediction as correct.
+        num_workers: Int indicating the number of threads evaluating
+            samples concurrently. Values above 1 require a thread-safe
+            ``detector``.
+        batch_size: Int indicating the number of images inferred per
+            detector call. Values above 1 require a ``detector`` that
+            takes a list of images and returns a list of results.
     # Returns:
     """
     positives, score, match = compute_matches(
-        dataset, detector, class_to_arg, iou_thresh)
+        dataset, detector, class_to_arg, iou_thresh, num_workers,
+        batch_size)
     precision, recall = calculate_relevance_metrics(positives, score, match)
     average_precisions = calculate_average_precisions(
         precision, recall, use_07_metric)
@@ -49,8 +49,7 @@ class AutoEncoderPredictor(SequentialProcessor):
              pr.ExpandDims(0)])
         self.add(pr.Predict(model, preprocess))
         self.add(pr.Squeeze(0))
-        self.add(pr.DenormalizeImage())
-        self.add(pr.CastImage('uint8'))
+        self.add(pr.DenormalizeImageToUint8())
         self.add(pr.WrapOutput(['image']))
 
 
@@ -64,8 +63,8 @@ class EncoderPredictor(SequentialProcessor):
         super(EncoderPredictor, self).__init__()
         self.encoder = encoder
         preprocess = SequentialProcessor([
-            pr.ConvertColorSpace(pr.RGB2BGR),
             pr.ResizeImage(encoder.input_shape[1:3]),
+            pr.ConvertColorSpace(pr.RGB2BGR),
             pr.NormalizeImage(),
             pr.ExpandDims(0)])
         self.add(pr.Predict(encoder, preprocess, pr.Squeeze(0)))
@@ -81,6 +80,5 @@ class DecoderPredictor(SequentialProcessor):
         self.decoder = decoder
         super(DecoderPredictor, self).__init__()
         self.add(pr.Predict(decoder, pr.ExpandDims(0), pr.Squeeze(0)))
-        self.add(pr.DenormalizeImage())
-        self.add(pr.CastImage('uint8'))
+        self.add(pr.DenormalizeImageToUint8())
         self.add(pr.ConvertColorSpace(pr.BGR2RGB))
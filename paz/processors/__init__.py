@@ -25,6 +25,7 @@ from .image import SubtractMeanImage
 from .image import AddMeanImage
 from .image import NormalizeImage
 from .image import DenormalizeImage
+from .image import DenormalizeImageToUint8
 from .image import LoadImage
 from .image import RandomSaturation
 from .image import RandomBrightness
@@ -6,11 +6,11 @@ from ..abstract import Processor, Box2D
 from ..backend.boxes import match
 from ..backend.boxes import encode
 from ..backend.boxes import decode
-from ..backend.boxes import offset
 from ..backend.boxes import clip
 from ..backend.boxes import nms_per_class
 from ..backend.boxes import denormalize_box
-from ..backend.boxes import make_box_square
+from ..backend.boxes import make_boxes_square
+from ..backend.boxes import offset_boxes
 
 
 class SquareBoxes2D(Processor):
@@ -20,8 +20,12 @@ class SquareBoxes2D(Processor):
         super(SquareBoxes2D, self).__init__()
 
     def call(self, boxes2D):
-        for box2D in boxes2D:
-            box2D.coordinates = make_box_square(box2D.coordinates)
+        if len(boxes2D) == 0:
+            return boxes2D
+        coordinates = np.array([box2D.coordinates for box2D in boxes2D])
+        coordinates = make_boxes_square(coordinates)
+        for box2D, box_coordinates in zip(boxes2D, coordinates.tolist()):
+            box2D.coordinates = box_coordinates
         return boxes2D
 
 
@@ -111,8 +115,12 @@ class OffsetBoxes2D(Processor):
         self.offsets = offsets
 
     def call(self, boxes2D):
-        for box2D in boxes2D:
-            box2D.coordinates = offset(box2D.coordinates, self.offsets)
+        if len(boxes2D) == 0:
+            return boxes2D
+        coordinates = np.array([box2D.coordinates for box2D in boxes2D])
+        coordinates = offset_boxes(coordinates, self.offsets)
+        for box2D, box_coordinates in zip(boxes2D, coordinates.tolist()):
+            box2D.coordinates = box_coordinates
         return boxes2D
 
 
@@ -153,7 +161,7 @@ class MatchBoxes(Processor):
         variance: List of two floats.
     """
     def __init__(self, prior_boxes, iou=.5):
-        self.prior_boxes = prior_boxes
+        self.prior_boxes = np.asarray(prior_boxes, dtype=np.float32)
         self.iou = iou
         super(MatchBoxes, self).__init__()
 
@@ -1,3 +1,5 @@
+import random
+
 import numpy as np
 
 from ..abstract import Processor
@@ -70,7 +72,7 @@ class RandomSampleCrop(Processor):
         super(RandomSampleCrop, self).__init__()
 
     def call(self, image, boxes):
-        if self.probability < np.random.rand():
+        if self.probability < random.random():
             return image, boxes
         labels = boxes[:, -1:]
         boxes = boxes[:, :4]
@@ -170,7 +172,7 @@ class Expand(Processor):
         self.probability = probability
 
     def call(self, image, boxes):
-        if self.probability < np.random.rand():
+        if self.probability < random.random():
             return image, boxes
         height, width, num_channels = image.shape
         ratio = np.random.uniform(1, self.max_ratio)
@@ -317,7 +319,7 @@ class RandomKeypointTranslation(Processor):
         return [x, y]
 
     def call(self, image, keypoints):
-        if self.probability >= np.random.rand():
+        if self.probability >= random.random():
             shape = image.shape[:2]
             translation = sample_scaled_translation(self.delta_scale, shape)
             if self.fill_color is None:
@@ -383,7 +385,7 @@ class RandomKeypointRotation(Processor):
         return np.random.uniform(-rotation_range, rotation_range)
 
     def call(self, image, keypoints):
-        if self.probability >= np.random.rand():
+        if self.probability >= random.random():
             degrees = self._sample_rotation(self.rotation_range)
             image = self._rotate_image(image, degrees)
             center = self._calculate_image_center(image)
@@ -434,7 +436,7 @@ class RandomRotation(Processor):
         return np.random.uniform(-rotation_range, rotation_range)
 
     def call(self, image):
-        if self.probability >= np.random.rand():
+        if self.probability >= random.random():
             degrees = self._sample_rotation(self.rotation_range)
             image = self._rotate_image(image, degrees)
         return image
@@ -1,3 +1,5 @@
+import random
+
 import numpy as np
 
 from ..abstract import Processor
@@ -47,7 +49,7 @@ class SubtractMeanImage(Processor):
         mean: List of length 3, containing the channel-wise mean.
     """
     def __init__(self, mean):
-        self.mean = mean
+        self.mean = np.asarray(mean, dtype=np.float32)
         super(SubtractMeanImage, self).__init__()
 
     def call(self, image):
@@ -88,6 +90,19 @@ class DenormalizeImage(Processor):
         return image * 255.0
 
 
+class DenormalizeImageToUint8(Processor):
+    """Denormalizes image by multiplying all values by 255.0 and casting
+    it to ``uint8`` in a single fused pass. The multiplication happens
+    in-place, so the given float image is consumed by this processor.
+    """
+    def __init__(self):
+        super(DenormalizeImageToUint8, self).__init__()
+
+    def call(self, image):
+        np.multiply(image, 255.0, out=image)
+        return image.astype('uint8')
+
+
 class LoadImage(Processor):
     """Loads image.
 
@@ -205,7 +220,7 @@ class RandomImageBlur(Processor):
         self.probability = probability
 
     def call(self, image):
-        if self.probability >= np.random.rand():
+        if self.probability >= random.random():
             image = random_image_blur(image)
         return image
 
@@ -223,7 +238,7 @@ class RandomGaussianBlur(Processor):
         self.probability = probability
 
     def call(self, image):
-        if self.probability >= np.random.rand():
+        if self.probability >= random.random():
             image = gaussian_image_blur(image, self.kernel_size)
         return image
 
@@ -403,7 +418,7 @@ class AddOcclusion(Processor):
         return draw_filled_polygon(image, vertices, color)
 
     def call(self, image):
-        if self.probability >= np.random.rand():
+        if self.probability >= random.random():
             image = self.add_occlusion(image, self.max_radius_scale)
         return image
 
@@ -421,7 +436,7 @@ class RandomImageCrop(Processor):
         super(RandomImageCrop, self).__init__()
 
     def call(self, image):
-        if self.probability < np.random.rand():
+        if self.probability < random.random():
             return image
         H, W = image.shape[:2]
         W_crop = np.random.uniform(self.crop_factor * W, W)
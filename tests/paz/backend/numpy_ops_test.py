@@ -10,6 +10,10 @@ from paz.backend.quaternion import rotation_vector_to_quaternion
 from paz.backend.boxes import encode
 from paz.backend.boxes import match
 from paz.backend.boxes import decode
+from paz.backend.boxes import make_box_square
+from paz.backend.boxes import make_boxes_square
+from paz.backend.boxes import offset
+from paz.backend.boxes import offset_boxes
 from paz.backend.boxes import flip_left_right
 from paz.backend.boxes import to_image_coordinates
 from paz.backend.boxes import to_normalized_coordinates
@@ -132,7 +136,7 @@ def test_to_center_form(boxes):
     box_A = boxes[0]
     boxes = to_center_form(box_A)
     boxes_A_result = to_point_form(boxes)
-    assert(boxes_A_result.all() == box_A.all())
+    assert np.allclose(boxes_A_result, box_A)
 
 
 def test_rotation_vector_to_quaternion(rotation_vector, quaternion_target):
@@ -169,6 +173,21 @@ def test_prior_boxes(target_prior_boxes):
     assert np.all(prior_boxes[:10].astype('float32') == target_prior_boxes)
 
 
+def test_make_boxes_square(boxes):
+    boxes_A = boxes[0]
+    square_boxes = make_boxes_square(boxes_A)
+    for box, square_box in zip(boxes_A, square_boxes):
+        assert tuple(square_box) == make_box_square(box)
+
+
+@pytest.mark.parametrize('offset_scales', [[0.1, 0.2]])
+def test_offset_boxes(boxes, offset_scales):
+    boxes_A = boxes[0]
+    boxes_with_offset = offset_boxes(boxes_A, offset_scales)
+    for box, box_with_offset in zip(boxes_A, boxes_with_offset):
+        assert tuple(box_with_offset) == offset(box, offset_scales)
+
+
 def test_flip_left_right_pass_by_value(boxes_with_label):
     initial_boxes_with_label = boxes_with_label.copy()
     flip_left_right(boxes_with_label, 1.0)